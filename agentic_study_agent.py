@@ -11,12 +11,19 @@ Deterministic Study Planner (no LLM).
 import os
 import json
 import datetime
+import heapq
+from collections import defaultdict
 from pathlib import Path
 import math
 import requests
 import sys
 import re
 
+try:
+    import orjson  # optional: much faster (de)serialization of plan.json
+except ImportError:
+    orjson = None
+
 # CONFIG (from env)
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
@@ -29,34 +36,54 @@ ROOT = Path(__file__).parent
 SYLLABUS_FILE = ROOT / "syllabus.json"
 PLAN_FILE = ROOT / "plan.json"
 
+# one HTTP session per process so repeated Telegram sends reuse the connection
+_SESSION = requests.Session()
+_SESSION.headers["Content-Type"] = "application/json"
+_TG_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage" if TELEGRAM_TOKEN else None
+
 # ---------------- utils ----------------
 def today_date():
     return datetime.date.today()
 
-def today_str(offset=0):
-    return (today_date() + datetime.timedelta(days=offset)).isoformat()
-
 def parse_date(s):
-    return datetime.datetime.strptime(s, "%Y-%m-%d").date()
+    # C-level ISO parser; input is documented as YYYY-MM-DD
+    return datetime.date.fromisoformat(s)
+
+def iso_dates(start, days):
+    # ISO strings for start .. start+days-1, built once per horizon
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(days)]
 
 def read_json(path):
     if not path.exists():
         return None
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 def write_json(path, obj):
+    if orjson is not None:
+        # orjson emits UTF-8 as-is, matching ensure_ascii=False
+        path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
     with open(path, "w", encoding="utf-8") as f:
         json.dump(obj, f, indent=2, ensure_ascii=False)
 
+def _round_plan(entries):
+    # round generated hours once, right before serialization, instead of on every allocation
+    for p in entries:
+        h = p.get("duration_hours")
+        if isinstance(h, float):
+            p["duration_hours"] = round(h, 2)
+    return entries
+
 def send_telegram(text):
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         print("Telegram not configured; skipping send.")
         return
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": text}
     try:
-        r = requests.post(url, json=payload, timeout=15)
+        r = _SESSION.post(_TG_URL, json=payload, timeout=15)
         print("Telegram status:", r.status_code, r.text)
     except Exception as e:
         print("Failed to send Telegram:", e)
@@ -76,9 +103,77 @@ def normalize_syllabus(syllabus):
     normalized.sort(key=lambda x: (-x["weight"], x["topic"]))
     return normalized
 
-def generate_plan(syllabus, start_date_str, exam_date_str, daily_hours):
-    start_date = parse_date(start_date_str)
-    exam_date = parse_date(exam_date_str)
+REVIEW_TOPIC = -1  # topic index used by _allocate for periodic review slots
+MAX_PASSES_PER_DAY = 4  # extra passes let the last few topics fill a day when time is short
+
+# allocation kernel: plain numbers in, parallel (day_idx, topic_idx, alloc) lists out.
+# `remaining` is updated in place, so whatever is left afterwards did not fit.
+def _allocate(remaining, weights, days, daily_hours, review_every, max_chunk):
+    if max_chunk <= 0:
+        raise ValueError("MAX_CHUNK_PER_TOPIC_PER_DAY must be positive.")
+    day_idx, topic_idx, allocs = [], [], []
+    # index keeps ties stable (syllabus order)
+    heap = [(-weights[i], -remaining[i], i) for i in range(len(remaining)) if remaining[i] > 0]
+    heapq.heapify(heap)
+    active_topics = len(heap)
+    review_dur = min(1.0, daily_hours)
+    # every review_every-th day gets a review slot; known up front, so check membership per day
+    review_days = set(range(review_every - 1, days, review_every)) if review_dur > 0 else set()
+    # study hours available after each day (review slots excluded)
+    capacity_after = [0.0] * days
+    for day in range(days - 2, -1, -1):
+        capacity_after[day] = capacity_after[day + 1] + daily_hours - (review_dur if day + 1 in review_days else 0.0)
+    hours_left = sum(r for r in remaining if r > 0)
+
+    for day in range(days):
+        capacity_left = daily_hours
+
+        # Add periodic review slot (reserve 1 hour if possible)
+        if day in review_days:
+            day_idx.append(day)
+            topic_idx.append(REVIEW_TOPIC)
+            allocs.append(review_dur)
+            capacity_left -= review_dur
+
+        if active_topics == 0:
+            continue
+
+        # allocate from the highest-priority topic with the most hours remaining.
+        # Within a pass each topic gets at most one chunk; a topic that got one is set
+        # aside until the pass ends. Another pass (bounded, like the old round-robin
+        # attempts) only runs when the hours left could not fit in the remaining days
+        # at one chunk per topic per day, so the per-day cap holds whenever it can.
+        passes = 0
+        while capacity_left > 1e-9 and active_topics > 0 and passes < MAX_PASSES_PER_DAY:
+            if passes and hours_left <= min(capacity_after[day], (days - day - 1) * active_topics * max_chunk) + 1e-9:
+                break
+            used_this_pass = []
+            while capacity_left > 1e-9 and heap:
+                w, _, i = heapq.heappop(heap)
+                # chunk size: don't give more than max_chunk to a topic per day
+                # unless the extra-pass check above says the time is needed
+                alloc = min(remaining[i], max_chunk, capacity_left)
+                if alloc <= 1e-9:
+                    # nothing left to give today; keep the topic for tomorrow
+                    used_this_pass.append((w, -remaining[i], i))
+                    break
+                day_idx.append(day)
+                topic_idx.append(i)
+                allocs.append(alloc)
+                remaining[i] -= alloc
+                capacity_left -= alloc
+                hours_left -= alloc
+                if remaining[i] < 1e-9:
+                    active_topics -= 1
+                else:
+                    used_this_pass.append((w, -remaining[i], i))
+            for entry in used_this_pass:
+                heapq.heappush(heap, entry)
+            passes += 1
+
+    return day_idx, topic_idx, allocs
+
+def generate_plan(syllabus, start_date, exam_date, daily_hours):
     if exam_date <= start_date:
         raise ValueError("EXAM_DATE must be after start_date (today).")
 
@@ -90,80 +185,55 @@ def generate_plan(syllabus, start_date_str, exam_date_str, daily_hours):
     total_hours_needed = sum(t["remaining"] for t in topics)
     capacity = days * daily_hours
 
-    plan = []
-    current_topic_index = 0
-
     # quick warning flag if not enough time
     not_enough_time = total_hours_needed > capacity
 
-    for day_offset in range(days):
-        date = (start_date + datetime.timedelta(days=day_offset)).isoformat()
-        capacity_left = daily_hours
-
-        # Add periodic review slot (reserve 1 hour if possible)
-        if (day_offset + 1) % REVIEW_EVERY_DAYS == 0:
-            review_dur = min(1.0, capacity_left)
-            if review_dur > 0:
-                plan.append({"date": date, "topic": "Review & Practice", "duration_hours": round(review_dur,2), "status":"pending", "notes":"Periodic review day"})
-                capacity_left -= review_dur
-
-        # allocate topics in round-robin starting from current_topic_index
-        attempts = 0
-        num_topics = len(topics)
-        # if no topics left break
-        if not any(t["remaining"] > 0 for t in topics):
-            # optional: add buffer or break
-            continue
+    remaining = [t["remaining"] for t in topics]
+    weights = [t["weight"] for t in topics]
+    day_idx, topic_idx, allocs = _allocate(remaining, weights, days, daily_hours, REVIEW_EVERY_DAYS, MAX_CHUNK_PER_TOPIC_PER_DAY)
 
-        while capacity_left > 0 and any(t["remaining"] > 0 for t in topics) and attempts < num_topics * 4:
-            # find next topic with remaining > 0
-            found = False
-            for i in range(num_topics):
-                idx = (current_topic_index + i) % num_topics
-                t = topics[idx]
-                if t["remaining"] > 0:
-                    # chunk size: don't give more than MAX_CHUNK_PER_TOPIC_PER_DAY to a topic per day
-                    max_chunk = min(MAX_CHUNK_PER_TOPIC_PER_DAY, capacity_left)
-                    alloc = min(t["remaining"], max_chunk, capacity_left)
-                    # allocate minimum granularity 0.25 hours if alloc is tiny
-                    if alloc <= 0:
-                        continue
-                    alloc = round(float(alloc), 2)
-                    plan.append({"date": date, "topic": t["topic"], "duration_hours": alloc, "status":"pending", "notes":""})
-                    t["remaining"] = round(t["remaining"] - alloc, 2)
-                    capacity_left = round(capacity_left - alloc, 2)
-                    # next time continue from next topic
-                    current_topic_index = (idx + 1) % num_topics
-                    found = True
-                    break
-            if not found:
-                break
-            attempts += 1
+    # build plan entries outside the kernel; hours are rounded by _round_plan before writing
+    date_strs = iso_dates(start_date, days)
+    plan = []
+    plan_append = plan.append
+    for day, i, alloc in zip(day_idx, topic_idx, allocs):
+        if i == REVIEW_TOPIC:
+            plan_append({"date": date_strs[day], "topic": "Review & Practice", "duration_hours": alloc, "status":"pending", "notes":"Periodic review day"})
+        else:
+            plan_append({"date": date_strs[day], "topic": topics[i]["topic"], "duration_hours": alloc, "status":"pending", "notes":""})
 
     # after scheduling until exam_date, collect any remaining topic hours as UNSCHEDULED
-    unscheduled = []
-    for t in topics:
-        if t["remaining"] > 0.0001:
-            unscheduled.append({"topic": t["topic"], "remaining_hours": round(t["remaining"],2), "priority": t["priority"]})
-
-    # if unscheduled, append them as entries with date "UNSCHEDULED" so user sees overflow
-    for u in unscheduled:
-        plan.append({"date":"UNSCHEDULED", "topic": u["topic"], "duration_hours": u["remaining_hours"], "status":"pending", "notes":"Not enough days before exam; increase daily hours or start earlier."})
+    # so user sees overflow
+    for t, left in zip(topics, remaining):
+        if left > 0.0001:
+            plan_append({"date":"UNSCHEDULED", "topic": t["topic"], "duration_hours": left, "status":"pending", "notes":"Not enough days before exam; increase daily hours or start earlier."})
 
     # attach a top-level metadata note as first element? Instead, include no metadata in plan file but return flag
     return plan, not_enough_time, total_hours_needed, capacity
 
 # ---------------- rescheduling missed ----------------
-def reschedule_missed(plan, start_date_str, exam_date_str, daily_hours):
-    today = today_date()
-    start_date = parse_date(start_date_str)
-    exam_date = parse_date(exam_date_str)
+_DONE_OR_MISSED = frozenset(("done", "missed"))
+
+def index_by_date(plan):
+    by_date = defaultdict(list)
+    for p in plan:
+        by_date[p.get("date")].append(p)
+    return by_date
+
+def entry_hours(p):
+    try:
+        return float(p.get("duration_hours",0))
+    except (TypeError, ValueError):
+        return 0.0
+
+def reschedule_missed(plan, today, exam_date, daily_hours, by_date=None):
     days = (exam_date - today).days
     if days < 0:
         days = 0
 
     # find missed sessions: date < today and status not 'done'
-    missed = [p for p in plan if p.get("date") not in (None,"UNSCHEDULED") and p.get("date") != "" and p.get("date") < today.isoformat() and p.get("status","pending") != "done" and p.get("status","pending") != "missed"]
+    today_iso = today.isoformat()
+    missed = [p for p in plan if (d := p.get("date")) and d != "UNSCHEDULED" and d < today_iso and p.get("status","pending") not in _DONE_OR_MISSED]
     if not missed:
         return plan, 0
 
@@ -171,44 +241,38 @@ def reschedule_missed(plan, start_date_str, exam_date_str, daily_hours):
     for m in missed:
         m["status"] = "missed"
         m.setdefault("notes", "")
-        m["notes"] = ("marked missed on " + today.isoformat() + "; " + m["notes"]).strip()
-
-    # build occupancy map for dates from today to exam_date-1
-    occupancy = {}
-    for d_offset in range(days):
-        d = (today + datetime.timedelta(days=d_offset)).isoformat()
-        occupancy[d] = 0.0
-    # include future planned sessions (pending) into occupancy
-    for p in plan:
-        d = p.get("date")
-        if d in occupancy and p.get("status","pending") != "missed":
-            try:
-                occupancy[d] += float(p.get("duration_hours",0))
-            except:
-                occupancy[d] += 0.0
+        m["notes"] = ("marked missed on " + today_iso + "; " + m["notes"]).strip()
+
+    # build occupancy map for dates from today to exam_date-1 from future planned (pending) sessions
+    if by_date is None:
+        by_date = index_by_date(plan)
+    occupancy = {d: sum(entry_hours(p) for p in by_date.get(d, ()) if p.get("status","pending") != "missed") for d in iso_dates(today, days)}
 
+    # max-heap of free time per day (largest gap first, then earliest date)
+    slack_heap = [(-(daily_hours - occ), d) for d, occ in occupancy.items() if occ < daily_hours]
+    heapq.heapify(slack_heap)
+
+    plan_append = plan.append
     placed = 0
     unscheduled = []
-    for m in missed:
-        dur = float(m.get("duration_hours", 0))
-        placed_flag = False
-        # try to find earliest day from today to exam_date-1 with space
-        for d_offset in range(days):
-            d = (today + datetime.timedelta(days=d_offset)).isoformat()
-            if occupancy.get(d, 0.0) + dur <= daily_hours + 1e-6:
-                # place
-                new_entry = {"date": d, "topic": m.get("topic"), "duration_hours": dur, "status":"pending", "notes":"rescheduled from " + str(m.get("date"))}
-                plan.append(new_entry)
-                occupancy[d] += dur
-                placed_flag = True
-                placed += 1
-                break
-        if not placed_flag:
+    # place longest sessions first, each into the largest free gap (worst-fit decreasing),
+    # so short ones fill the gaps left over
+    by_duration = sorted(((float(m.get("duration_hours", 0)), m) for m in missed), key=lambda x: -x[0])
+    for dur, m in by_duration:
+        # the largest gap is the only one worth checking: if it can't fit, none can
+        if slack_heap and -slack_heap[0][0] + 1e-6 >= dur:
+            neg_slack, d = heapq.heappop(slack_heap)
+            plan_append({"date": d, "topic": m.get("topic"), "duration_hours": dur, "status":"pending", "notes":"rescheduled from " + str(m.get("date"))})
+            slack = -neg_slack - dur
+            if slack > 1e-9:
+                heapq.heappush(slack_heap, (-slack, d))
+            placed += 1
+        else:
             # cannot place before exam_date
             unscheduled.append(m)
     # unscheduled remain marked as missed in plan; optionally add entries with date UNSCHEDULED
     for u in unscheduled:
-        plan.append({"date":"UNSCHEDULED", "topic": u.get("topic"), "duration_hours": float(u.get("duration_hours", u.get("duration_hours",0) or u.get("duration_hours",0) or 0)), "status":"pending", "notes":"reschedule failed: not enough free days before exam."})
+        plan_append({"date":"UNSCHEDULED", "topic": u.get("topic"), "duration_hours": float(u.get("duration_hours", 0) or 0), "status":"pending", "notes":"reschedule failed: not enough free days before exam."})
     return plan, placed
 
 # ---------------- main ----------------
@@ -224,15 +288,15 @@ def main():
 
     plan = read_json(PLAN_FILE) or []
 
-    start_date_str = today_str(0)
-    exam_date_str = EXAM_DATE
+    today = today_date()
+    exam_date = parse_date(EXAM_DATE)
 
     # if no plan exist, generate one
     if not plan:
         print("No plan.json found or empty -> generating plan (deterministic)...")
-        plan, not_enough_time, total_needed, capacity = generate_plan(syllabus, start_date_str, exam_date_str, DAILY_HOURS)
-        write_json(PLAN_FILE, plan)
-        summary = f"Generated plan from {start_date_str} to {exam_date_str}. Required hours: {total_needed}. Capacity: {capacity}."
+        plan, not_enough_time, total_needed, capacity = generate_plan(syllabus, today, exam_date, DAILY_HOURS)
+        write_json(PLAN_FILE, _round_plan(plan))
+        summary = f"Generated plan from {today} to {exam_date}. Required hours: {total_needed}. Capacity: {capacity}."
         if not_enough_time:
             summary += " WARNING: not enough time to finish all topics before exam."
         print(summary)
@@ -240,10 +304,11 @@ def main():
         return
 
     # send today's tasks
-    today = today_str(0)
-    todays = [p for p in plan if p.get("date") == today and p.get("status","pending") != "done"]
+    today_iso = today.isoformat()
+    by_date = index_by_date(plan)
+    todays = [p for p in by_date[today_iso] if p.get("status","pending") != "done"]
     if todays:
-        msg = f"📚 Study plan for {today}:\n"
+        msg = f"📚 Study plan for {today_iso}:\n"
         for i,t in enumerate(todays,1):
             msg += f"{i}) {t.get('topic')} — {t.get('duration_hours')} hrs\n"
         msg += "\nTo mark tasks done: edit plan.json in the repo and set status to \"done\" for that entry."
@@ -252,7 +317,7 @@ def main():
         print("No tasks scheduled for today.")
 
     # detect missed sessions and reschedule them
-    updated_plan, placed = reschedule_missed(plan, start_date_str, exam_date_str, DAILY_HOURS)
+    updated_plan, placed = reschedule_missed(plan, today, exam_date, DAILY_HOURS, by_date)
     if placed > 0:
         write_json(PLAN_FILE, updated_plan)
         send_telegram(f"🔁 Rescheduled {placed} missed session(s). Check updated plan.json.")
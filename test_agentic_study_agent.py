@@ -0,0 +1,84 @@
+import datetime
+from collections import defaultdict
+
+import pytest
+
+import agentic_study_agent as agent
+
+
+def test_generate_plan_respects_per_day_topic_cap_when_time_allows():
+    syllabus = agent.read_json(agent.SYLLABUS_FILE)
+    start = datetime.date(2026, 10, 15)
+    exam = datetime.date(2026, 11, 1)
+    for daily_hours in (2, 3, 4, 5, 6, 8):
+        plan = agent.generate_plan(syllabus, start, exam, daily_hours)[0]
+        per_day = defaultdict(float)
+        for p in plan:
+            if p["date"] != "UNSCHEDULED" and p["topic"] != "Review & Practice":
+                per_day[(p["date"], p["topic"])] += p["duration_hours"]
+        assert max(per_day.values()) <= agent.MAX_CHUNK_PER_TOPIC_PER_DAY + 1e-9, daily_hours
+
+
+def test_allocate_rejects_non_positive_chunk():
+    with pytest.raises(ValueError):
+        agent._allocate([4.0], [3], 5, 2.0, 6, 0.0)
+
+
+def test_main_keeps_existing_durations_on_reschedule(tmp_path, monkeypatch):
+    plan = [
+        {"date": "2026-10-14", "topic": "A", "duration_hours": 1.333, "status": "done", "notes": ""},
+        {"date": "2026-10-14", "topic": "B", "duration_hours": 0.6666, "status": "pending", "notes": ""},
+    ]
+    plan_file = tmp_path / "plan.json"
+    agent.write_json(plan_file, plan)
+    monkeypatch.setattr(agent, "PLAN_FILE", plan_file)
+    monkeypatch.setattr(agent, "EXAM_DATE", "2026-10-20")
+    monkeypatch.setattr(agent, "today_date", lambda: datetime.date(2026, 10, 15))
+    monkeypatch.setattr(agent, "send_telegram", lambda text: None)
+    agent.main()
+
+    written = agent.read_json(plan_file)
+    assert written[0]["duration_hours"] == 1.333
+    assert written[1]["duration_hours"] == 0.6666
+    assert written[2]["duration_hours"] == 0.6666
+
+
+@pytest.mark.parametrize("syllabus, days, daily_hours", [
+    ([{"topic": "Only", "est_hours": 10, "priority": "high"}], 3, 8),
+    (None, 5, 5),
+])
+def test_generate_plan_fills_days_when_capacity_suffices(syllabus, days, daily_hours):
+    syllabus = syllabus or agent.read_json(agent.SYLLABUS_FILE)
+    start = datetime.date(2026, 10, 15)
+    exam = start + datetime.timedelta(days=days)
+    plan, not_enough_time, total_needed, capacity = agent.generate_plan(syllabus, start, exam, daily_hours)
+    assert total_needed <= capacity and not not_enough_time
+    assert [p for p in plan if p["date"] == "UNSCHEDULED"] == []
+
+
+def _entry(date, hours, status="pending"):
+    return {"date": date, "topic": f"{date} {hours}h", "duration_hours": hours, "status": status, "notes": ""}
+
+
+def test_reschedule_missed_places_longest_first_into_largest_gap():
+    plan = [
+        _entry("2026-10-12", 0.5), _entry("2026-10-13", 1.5), _entry("2026-10-14", 1.0),
+        _entry("2026-10-15", 1.0), _entry("2026-10-16", 0.5),
+    ]
+    plan, placed = agent.reschedule_missed(plan, datetime.date(2026, 10, 15), datetime.date(2026, 10, 18), 2.0)
+
+    assert placed == 3
+    assert [(p["duration_hours"], p["date"]) for p in plan[5:]] == [
+        (1.5, "2026-10-17"), (1.0, "2026-10-16"), (0.5, "2026-10-15"),
+    ]
+
+
+def test_reschedule_missed_breaks_ties_by_date_and_overflows_to_unscheduled():
+    plan = [_entry("2026-10-13", 1.0), _entry("2026-10-14", 3.0)]
+    plan, placed = agent.reschedule_missed(plan, datetime.date(2026, 10, 15), datetime.date(2026, 10, 17), 2.0)
+
+    assert placed == 1
+    assert [(p["duration_hours"], p["date"]) for p in plan[2:]] == [
+        (1.0, "2026-10-15"), (3.0, "UNSCHEDULED"),
+    ]
+    assert all(p["status"] == "missed" for p in plan[:2])